@@ -7,15 +7,85 @@ Ce module collecte des informations de configuration essentielles pour un audit
 en se basant sur les commandes natives d'Apache et l'analyse des fichiers de configuration.
 """
 
+import asyncio
+import glob
+import hashlib
+import mmap
 import subprocess
 import os
 import re
-import json
+import stat
+from collections import deque
 from datetime import datetime
 
+from utils import cached, cache_get, cache_set, save_json_report
+
+# --- Constantes et expressions régulières (compilées une seule fois au chargement) ---
+
+# Directives de sécurité et de configuration critiques à rechercher
+_DIRECTIVES_TO_FIND = (
+    'ServerTokens', 'ServerSignature', 'TraceEnable', 'KeepAlive', 'KeepAliveTimeout',
+    'Timeout', 'MaxRequestWorkers', 'User', 'Group', 'Listen', 'LogLevel',
+    'ErrorLog', 'CustomLog', 'SSLEngine', 'SSLProtocol', 'SSLCipherSuite',
+    'Options', 'AllowOverride'
+)
+
+# Les directives Apache sont insensibles à la casse : index par nom en minuscules
+_DIRECTIVES_BY_NAME = {key.lower(): key for key in _DIRECTIVES_TO_FIND}
+
+# Une seule expression pour les inclusions et toutes les directives recherchées :
+# chaque correspondance produit soit (inc, path), soit (dir, val)
+_DIRECTIVE_RE = re.compile(
+    rb'(?mi)^[ \t]*(?:(?P<inc>include(?:optional)?)[ \t]+(?P<path>\S+)|(?P<dir>'
+    + b'|'.join(re.escape(d.encode()) for d in _DIRECTIVES_TO_FIND)
+    + rb')\b[ \t]*(?P<val>[^\r\n]*))'
+)
+
+# Informations extraites de la sortie de 'apache2ctl -V'
+_APACHE_V_PATTERNS = {
+    'server_version': re.compile(rb"Server version: (.*)"),
+    'server_built': re.compile(rb"Server built:   (.*)"),
+    'server_mpm': re.compile(rb"Server MPM:     (.*)"),
+    'config_file': re.compile(rb"-D SERVER_CONFIG_FILE=\"(.*?)\"")
+}
+
+# --- Fonction utilitaire d'exécution des commandes ---
+
+async def _run_command(command):
+    """
+    Exécute une commande (sans shell) de manière asynchrone et retourne sa sortie.
+    La sortie est retournée brute (bytes), sans décodage : elle est analysée
+    directement par des expressions régulières sur bytes.
+
+    Args:
+        command (list): La commande à exécuter, sous forme de liste d'arguments.
+
+    Returns:
+        La sortie standard de la commande (bytes).
+
+    Raises:
+        FileNotFoundError: Si l'exécutable est introuvable.
+        subprocess.CalledProcessError: Si la commande retourne un code non nul.
+    """
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    stdout, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(
+            process.returncode, command,
+            output=stdout.decode('utf-8', errors='replace'),
+            stderr=stderr.decode('utf-8', errors='replace')
+        )
+    return stdout
+
+
 # --- Fonctions de collecte d'informations ---
 
-def _get_apache_version_and_paths(logger):
+@cached('/usr/sbin/apache2', per_boot=True)
+async def _get_apache_version_and_paths(logger):
     """
     Exécute 'apache2ctl -V' pour obtenir la version, les chemins de configuration, etc.
     C'est le point de départ le plus fiable pour trouver les informations clés.
@@ -30,26 +100,13 @@ def _get_apache_version_and_paths(logger):
     apache_info = {}
     try:
         # Utiliser 'apache2ctl' qui est le standard sur Debian/Ubuntu
-        result = subprocess.run(
-            ['apache2ctl', '-V'],
-            capture_output=True,
-            text=True,
-            check=True,
-            encoding='utf-8'
-        )
+        stdout = await _run_command(['apache2ctl', '-V'])
         
-        # Expressions régulières pour extraire les informations clés
-        patterns = {
-            'server_version': r"Server version: (.*)",
-            'server_built': r"Server built:   (.*)",
-            'server_mpm': r"Server MPM:     (.*)",
-            'config_file': r"-D SERVER_CONFIG_FILE=\"(.*?)\""
-        }
-        
-        for key, pattern in patterns.items():
-            match = re.search(pattern, result.stdout)
+        # Extraire les informations clés directement de la sortie brute
+        for key, pattern in _APACHE_V_PATTERNS.items():
+            match = pattern.search(stdout)
             if match:
-                apache_info[key] = match.group(1).strip()
+                apache_info[key] = match.group(1).strip().decode('utf-8', errors='replace')
         
         if not apache_info:
              logger.warning("Impossible d'extraire les informations de version depuis la sortie de 'apache2ctl -V'.")
@@ -67,7 +124,8 @@ def _get_apache_version_and_paths(logger):
         return None
 
 
-def _get_loaded_modules(logger):
+@cached('/usr/sbin/apache2', '/etc/apache2/apache2.conf', '/etc/apache2/mods-enabled', per_boot=True)
+async def _get_loaded_modules(logger):
     """
     Liste les modules chargés par Apache via 'apache2ctl -M'.
     
@@ -80,19 +138,13 @@ def _get_loaded_modules(logger):
     logger.info("Récupération des modules Apache chargés via 'apache2ctl -M'.")
     modules = []
     try:
-        result = subprocess.run(
-            ['apache2ctl', '-M'],
-            capture_output=True,
-            text=True,
-            check=True,
-            encoding='utf-8'
-        )
+        stdout = await _run_command(['apache2ctl', '-M'])
         # La sortie liste les modules avec "(static)" ou "(shared)"
         # On ne garde que le nom du module
-        for line in result.stdout.splitlines():
+        for line in stdout.splitlines():
             line = line.strip()
-            if 'module' in line:
-                module_name = line.split()[0]
+            if b'module' in line:
+                module_name = line.split()[0].decode('utf-8', errors='replace')
                 modules.append(module_name)
         
         logger.info(f"{len(modules)} modules Apache trouvés.")
@@ -106,37 +158,62 @@ def _parse_config_files(config_file_path, logger):
     """
     Analyse le fichier de configuration principal d'Apache et les fichiers inclus.
     Recherche des directives de sécurité importantes.
+    Le résultat est mis en cache tant qu'aucun des fichiers analysés n'est modifié.
     
     Args:
         config_file_path: Chemin vers le fichier de configuration principal (ex: /etc/apache2/apache2.conf).
         logger: L'objet logger.
 
     Returns:
-        Un dictionnaire contenant les directives de configuration trouvées.
+        Un tuple (directives de configuration trouvées, liste des fichiers analysés).
+    """
+    cache_key = f"{__name__}._parse_config_files:{config_file_path}"
+    cached_result = cache_get(cache_key)
+    if isinstance(cached_result, dict) and "directives" in cached_result and "files" in cached_result:
+        logger.info(f"Directives de '{config_file_path}' reprises du cache (fichiers inchangés).")
+        return cached_result["directives"], cached_result["files"]
+
+    found_directives, scanned_files, dependencies = _scan_config_files(config_file_path, logger)
+    if found_directives:
+        cache_set(cache_key, {"directives": found_directives, "files": scanned_files}, files=dependencies)
+    return found_directives, scanned_files
+
+
+def _has_wildcard(path_pattern):
+    """Indique si un chemin d'inclusion Apache contient un joker (*, ? ou [...])."""
+    return any(char in path_pattern for char in '*?[')
+
+
+def _scan_config_files(config_file_path, logger):
+    """
+    Parcourt le fichier de configuration principal et ses inclusions.
+
+    Args:
+        config_file_path: Chemin vers le fichier de configuration principal.
+        logger: L'objet logger.
+
+    Returns:
+        Un tuple (directives trouvées, liste des fichiers analysés, ensemble des chemins
+        dont dépend le résultat : fichiers visités et répertoires des inclusions avec jokers).
     """
     if not config_file_path or not os.path.exists(config_file_path):
         logger.error(f"Le fichier de configuration principal '{config_file_path}' est introuvable.")
-        return {}
+        return {}, [], set()
 
     logger.info(f"Début de l'analyse des fichiers de configuration à partir de '{config_file_path}'.")
     
-    # Directives de sécurité et de configuration critiques à rechercher
-    directives_to_find = [
-        'ServerTokens', 'ServerSignature', 'TraceEnable', 'KeepAlive', 'KeepAliveTimeout',
-        'Timeout', 'MaxRequestWorkers', 'User', 'Group', 'Listen', 'LogLevel',
-        'ErrorLog', 'CustomLog', 'SSLEngine', 'SSLProtocol', 'SSLCipherSuite',
-        'Options', 'AllowOverride'
-    ]
-    
-    found_directives = {key: "Non trouvé" for key in directives_to_find}
+    found_directives = {key: "Non trouvé" for key in _DIRECTIVES_TO_FIND}
     processed_files = set()
+    scanned_files = []
+    # Répertoires des inclusions avec jokers : un fichier ajouté doit invalider le cache
+    include_dirs = set()
     
-    # file_paths_to_scan est une pile de chemins à analyser
+    # file_paths_to_scan est une file (parcours en largeur) de chemins à analyser
     config_dir = os.path.dirname(config_file_path)
-    file_paths_to_scan = [config_file_path]
+    file_paths_to_scan = deque([config_file_path])
     
     while file_paths_to_scan:
-        current_path = file_paths_to_scan.pop(0)
+        current_path = file_paths_to_scan.popleft()
         
         if current_path in processed_files:
             continue
@@ -147,43 +224,88 @@ def _parse_config_files(config_file_path, logger):
             continue
             
         logger.info(f"Analyse de : {current_path}")
+        scanned_files.append(current_path)
         try:
-            with open(current_path, 'r', encoding='utf-8', errors='ignore') as f:
-                for line in f:
-                    line = line.strip()
-                    # Ignorer les commentaires et les lignes vides
-                    if not line or line.startswith('#'):
-                        continue
-                    
+            # mmap ne supporte pas les fichiers vides
+            if os.path.getsize(current_path) == 0:
+                continue
+
+            # Un seul passage du moteur d'expressions régulières sur le fichier projeté en mémoire
+            with open(current_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for match in _DIRECTIVE_RE.finditer(mm):
                     # Chercher les directives d'inclusion pour les ajouter à la liste
-                    if line.lower().startswith(('include ', 'includeoptional ')):
-                        path_pattern = line.split(maxsplit=1)[1]
+                    if match['inc']:
+                        path_pattern = match['path'].decode('utf-8', errors='ignore')
                         # Construire un chemin absolu si le chemin est relatif
                         if not os.path.isabs(path_pattern):
                             path_pattern = os.path.join(config_dir, path_pattern)
-                        # Pour l'instant, on gère les inclusions simples. Le globbing pourrait être ajouté.
-                        file_paths_to_scan.append(path_pattern)
+                        # Développer les jokers (ex: mods-enabled/*.load) dans l'ordre alphabétique, comme Apache
+                        if _has_wildcard(path_pattern):
+                            include_dirs.add(os.path.dirname(path_pattern))
+                            file_paths_to_scan.extend(sorted(glob.glob(path_pattern)))
+                        else:
+                            file_paths_to_scan.append(path_pattern)
                         continue
 
-                    # Chercher les directives importantes
-                    parts = line.split(maxsplit=1)
-                    directive = parts[0]
-                    
-                    if directive in directives_to_find:
-                        value = parts[1] if len(parts) > 1 else "Activé (sans valeur)"
-                        # On stocke la dernière valeur trouvée, qui est souvent celle qui s'applique
-                        found_directives[directive] = value
+                    # Directive importante
+                    directive = _DIRECTIVES_BY_NAME[match['dir'].decode().lower()]
+                    value = match['val'].decode('utf-8', errors='ignore').strip()
+                    # On stocke la dernière valeur trouvée, qui est souvent celle qui s'applique
+                    found_directives[directive] = value or "Activé (sans valeur)"
 
         except Exception as e:
             logger.error(f"Erreur lors de la lecture du fichier '{current_path}': {e}")
             
     logger.info("Analyse des fichiers de configuration terminée.")
-    return found_directives
+    return found_directives, scanned_files, processed_files | include_dirs
+
+
+def _sha256_file(file_path):
+    """
+    Calcule l'empreinte SHA-256 d'un fichier par lecture en flux, sans le charger en mémoire.
+    hashlib.file_digest (Python >= 3.11) alimente directement OpenSSL ; repli par blocs sinon.
+    """
+    with open(file_path, 'rb') as f:
+        if hasattr(hashlib, 'file_digest'):
+            return hashlib.file_digest(f, 'sha256').hexdigest()
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+
+def _get_config_file_integrity(config_file_path, logger):
+    """
+    Calcule l'empreinte SHA-256 du fichier de configuration et relève ses
+    métadonnées (taille, permissions, propriétaire) via os.stat,
+    sans conserver son contenu dans les résultats de l'audit.
+
+    Args:
+        config_file_path: Chemin vers le fichier de configuration.
+        logger: L'objet logger.
+
+    Returns:
+        Un dictionnaire avec le chemin, l'empreinte et les métadonnées, ou une erreur.
+    """
+    try:
+        file_stat = os.stat(config_file_path)
+        sha256 = _sha256_file(config_file_path)
+    except OSError as e:
+        logger.error(f"Impossible de lire '{config_file_path}' pour en calculer l'empreinte : {e}")
+        return {"path": config_file_path, "error": str(e)}
+    return {
+        "path": config_file_path,
+        "sha256": sha256,
+        "size": file_stat.st_size,
+        "mode": stat.filemode(file_stat.st_mode),
+        "uid": file_stat.st_uid,
+        "gid": file_stat.st_gid
+    }
 
 
 # --- Fonction principale du module ---
 
-def run_apache_audit(logger):
+async def run_apache_audit(logger):
     """
     Orchestre l'audit complet du serveur Apache.
 
@@ -202,11 +324,19 @@ def run_apache_audit(logger):
         },
         "server_info": {},
         "loaded_modules": [],
-        "config_directives": {}
+        "config_directives": {},
+        "config_files_integrity": []
     }
 
-    # 1. Obtenir la version et les informations de base
-    server_info = _get_apache_version_and_paths(logger)
+    main_config_file = "/etc/apache2/apache2.conf"  # Chemin par défaut pour Debian/Ubuntu
+
+    # 1. Collecte en parallèle : les commandes 'apache2ctl' (coroutines) et l'analyse
+    # des fichiers de configuration, bloquante, déléguée au pool de threads d'asyncio
+    server_info, loaded_modules, (config_directives, config_files) = await asyncio.gather(
+        _get_apache_version_and_paths(logger),
+        _get_loaded_modules(logger),
+        asyncio.to_thread(_parse_config_files, main_config_file, logger)
+    )
     if not server_info:
         logger.error("Audit Apache interrompu : impossible de récupérer les informations de base.")
         audit_results['error'] = "Impossible de communiquer avec Apache via 'apache2ctl'."
@@ -215,18 +345,19 @@ def run_apache_audit(logger):
     audit_results["server_info"] = server_info
 
     # 2. Lister les modules chargés
-    audit_results["loaded_modules"] = _get_loaded_modules(logger)
+    audit_results["loaded_modules"] = loaded_modules
 
     # 3. Analyser les fichiers de configuration
-    main_config_file = "/etc/apache2/apache2.conf"  # Chemin par défaut pour Debian/Ubuntu
-    audit_results["config_directives"] = _parse_config_files(main_config_file, logger)
+    audit_results["config_directives"] = config_directives
+
+    # 4. Empreinte de chaque fichier de configuration analysé (contrôle d'intégrité),
+    # calculées en parallèle : hashlib libère le GIL pendant le calcul
+    audit_results["config_files_integrity"] = list(await asyncio.gather(*(
+        asyncio.to_thread(_get_config_file_integrity, path, logger) for path in config_files
+    )))
 
     logger.info("="*20 + " FIN DE L'AUDIT APACHE " + "="*20)
 
 
-    os.makedirs("audits", exist_ok=True)
     filename = f"audits/audit_apache_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-    with open(filename, "w") as f:
-        json.dump(audit_results, f, indent=4)
-
-    return filename
\ No newline at end of file
+    return save_json_report(filename, audit_results)
\ No newline at end of file
@@ -7,59 +7,128 @@ This module collects critical operating system information to identify potential
 misconfigurations and security weaknesses. It uses native system commands and file parsing.
 """
 
-import subprocess
+import asyncio
+import json
 import os
 import re
-import json
 from datetime import datetime
 import stat # Used for checking file permissions
 
+from utils import cached, cache_get, cache_set, save_json_report
+
 # --- Helper Function for Running Commands ---
 
-def _run_command(command, logger):
+async def _run_command(command, logger, text=True, label=None):
     """
-    Executes a shell command and returns its output.
+    Executes a command asynchronously (without a shell) and returns its output.
     
     Args:
         command (list): The command to execute as a list of strings.
         logger: The logger object for logging events.
+        text (bool): If False, stdout is returned as raw bytes without decoding,
+            for large outputs that are only scanned with bytes regexes.
+        label (str): Short name used in log messages instead of the full command line.
 
     Returns:
         tuple: (stdout, stderr) of the command. Returns (None, error_message) on failure.
     """
+    display_name = label or ' '.join(command)
     try:
-        process = subprocess.run(
-            command,
-            capture_output=True,
-            text=True,
-            check=False, # We handle errors manually
-            encoding='utf-8'
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
         )
-        if process.returncode != 0:
-            error_msg = process.stderr.strip()
+        stdout, stderr = await process.communicate()
+        if process.returncode != 0: # We handle errors manually
+            error_msg = stderr.decode('utf-8', errors='replace').strip()
             # Log non-critical errors as warnings (e.g., command not found)
-            logger.warning(f"Command '{' '.join(command)}' failed with exit code {process.returncode}: {error_msg}")
+            logger.warning(f"Command '{display_name}' failed with exit code {process.returncode}: {error_msg}")
             return (None, error_msg)
-        return (process.stdout.strip(), None)
+        stdout = stdout.strip()
+        return (stdout.decode('utf-8', errors='replace') if text else stdout, None)
     except FileNotFoundError:
         error_msg = f"Command '{command[0]}' not found."
         logger.error(error_msg)
         return (None, error_msg)
     except Exception as e:
-        error_msg = f"An unexpected error occurred with command '{' '.join(command)}': {e}"
+        error_msg = f"An unexpected error occurred with command '{display_name}': {e}"
         logger.error(error_msg)
         return (None, error_msg)
 
 
+# Fixed system interpreter for the privileged helper: sys.executable may be a
+# user-owned virtualenv or pyenv binary, which must not be run as root
+_SYSTEM_PYTHON = '/usr/bin/python3'
+
+# Script run as root by a single 'sudo python3 -I -c' call. It performs every privileged
+# read of the audit and prints the results as one JSON object on stdout.
+_PRIVILEGED_HELPER = """
+import json, subprocess
+
+def read(path):
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            return f.read()
+    except OSError:
+        return None
+
+def run(command):
+    try:
+        process = subprocess.run(command, capture_output=True, text=True)
+    except FileNotFoundError:
+        return None
+    return process.stdout.strip() if process.returncode == 0 else None
+
+ufw = run(['ufw', 'status'])
+print(json.dumps({
+    'shadow': read('/etc/shadow'),
+    'ufw': ufw,
+    'iptables': None if ufw else run(['iptables', '-L']),
+}))
+"""
+
+async def _collect_privileged_data(logger):
+    """
+    Collects all the data that requires root privileges with one 'sudo' invocation.
+
+    Running a single helper instead of one 'sudo' per command means sudo/PAM
+    authentication and the sudoers parsing happen once per audit, and the user
+    is prompted for a password at most once even though collectors run concurrently.
+
+    The audit user therefore needs sudo rights to run /usr/bin/python3 as root,
+    which amounts to full root access: narrower sudoers rules limited to
+    'ufw status', 'iptables -L' or 'cat /etc/shadow' are not sufficient.
+
+    Returns:
+        dict: {'shadow', 'ufw', 'iptables'} (each None if unavailable), or {} on failure.
+    """
+    logger.info("Collecting privileged data (shadow file, firewall rules) with a single sudo call.")
+    # -I (isolated mode): the current directory is not put on sys.path and PYTHON*
+    # variables are ignored, so a planted json.py/subprocess.py cannot run as root
+    stdout, _ = await _run_command(
+        ['sudo', _SYSTEM_PYTHON, '-I', '-c', _PRIVILEGED_HELPER], logger,
+        label=f"sudo {_SYSTEM_PYTHON} <privileged helper>"
+    )
+    if not stdout:
+        return {}
+    try:
+        return json.loads(stdout)
+    except ValueError as e:
+        logger.error(f"Could not decode the privileged helper output: {e}")
+        return {}
+
+
 # --- Information Gathering Functions ---
 
-def _get_os_info(logger):
+@cached('/etc/os-release', per_boot=True)
+async def _get_os_info(logger):
     """Collects basic Operating System information."""
     logger.info("Collecting OS information.")
     os_info = {}
     
     # Kernel version
-    stdout, _ = _run_command(['uname', '-a'], logger)
+    stdout, _ = await _run_command(['uname', '-a'], logger)
     if stdout:
         os_info['kernel_version'] = stdout
         
@@ -75,25 +144,31 @@ def _get_os_info(logger):
         
     return os_info
 
-def _get_user_info(logger):
-    """Collects information about users and groups."""
+async def _get_user_info(logger, privileged_data):
+    """
+    Collects information about users and groups.
+    `privileged_data` is the task returned by _collect_privileged_data.
+    """
     logger.info("Collecting user and group information.")
     user_info = {
         'login_users': [],
+        'uid0_users': [],
         'sudo_users': [],
         'users_with_no_password': [],
         'root_ssh_login': 'Not checked'
     }
 
-    # Users with a login shell from /etc/passwd
+    # Users with a login shell and accounts with UID 0 from /etc/passwd (single pass)
     try:
         with open('/etc/passwd', 'r', encoding='utf-8') as f:
             for line in f:
                 parts = line.strip().split(':')
                 if len(parts) == 7:
-                    username, shell = parts[0], parts[6]
+                    username, uid, shell = parts[0], parts[2], parts[6]
                     if shell not in ['/sbin/nologin', '/bin/false', '/usr/sbin/nologin']:
                         user_info['login_users'].append(username)
+                    if uid == '0':
+                        user_info['uid0_users'].append(username)
     except FileNotFoundError:
         logger.error("File /etc/passwd not found.")
     
@@ -109,10 +184,10 @@ def _get_user_info(logger):
     except FileNotFoundError:
         logger.warning("File /etc/group not found.")
 
-    # Check for users with no password in /etc/shadow (requires privileges)
-    stdout, _ = _run_command(['sudo', 'cat', '/etc/shadow'], logger)
-    if stdout:
-        for line in stdout.splitlines():
+    # Check for users with no password in /etc/shadow (read by the privileged helper)
+    shadow = (await privileged_data).get('shadow')
+    if shadow:
+        for line in shadow.splitlines():
             parts = line.strip().split(':')
             if len(parts) > 1:
                 username, pass_hash = parts[0], parts[1]
@@ -134,8 +209,11 @@ def _get_user_info(logger):
 
     return user_info
 
-def _get_network_info(logger):
-    """Collects networking information like open ports and firewall status."""
+async def _get_network_info(logger, privileged_data):
+    """
+    Collects networking information like open ports and firewall status.
+    `privileged_data` is the task returned by _collect_privileged_data.
+    """
     logger.info("Collecting network information.")
     network_info = {
         'listening_ports': 'Not checked',
@@ -143,20 +221,19 @@ def _get_network_info(logger):
     }
     
     # Use 'ss' (socket statistics) which is more modern than 'netstat'
-    stdout, _ = _run_command(['ss', '-tuln'], logger)
+    stdout, _ = await _run_command(['ss', '-tuln'], logger)
     if stdout:
         network_info['listening_ports'] = stdout.splitlines()
 
     # Check for UFW (Uncomplicated Firewall), common on Ubuntu
-    stdout, _ = _run_command(['sudo', 'ufw', 'status'], logger)
-    if stdout:
-         network_info['firewall_status'] = stdout
+    privileged = await privileged_data
+    if privileged.get('ufw'):
+         network_info['firewall_status'] = privileged['ufw']
     else:
-        # Fallback to check for iptables if ufw is not active/installed
+        # Fallback to iptables rules if ufw is not active/installed
         logger.info("UFW not active or installed, checking for iptables rules.")
-        stdout, _ = _run_command(['sudo', 'iptables', '-L'], logger)
-        if stdout:
-            network_info['firewall_status'] = "Using iptables:\n" + stdout
+        if privileged.get('iptables'):
+            network_info['firewall_status'] = "Using iptables:\n" + privileged['iptables']
         else:
             network_info['firewall_status'] = "No firewall tool (UFW/iptables) found or active."
 
@@ -174,51 +251,106 @@ def _check_sensitive_file_permissions(logger):
     permissions = {}
 
     for f_path, expected_perm_str in files_to_check.items():
-        if os.path.exists(f_path):
-            try:
-                # Use 'sudo stat' because /etc/shadow and /etc/sudoers are not readable by normal users
-                cmd = ['sudo', 'stat', '-c', '%a', f_path]
-                stdout, stderr = _run_command(cmd, logger)
-                
-                if stdout:
-                    current_perm = stdout.strip()
-                    permissions[f_path] = {
-                        'current': current_perm,
-                        'recommended': expected_perm_str,
-                        'is_secure': current_perm == expected_perm_str
-                    }
-                else:
-                     permissions[f_path] = {'error': f'Could not stat file: {stderr}'}
-
-            except Exception as e:
-                permissions[f_path] = {'error': f'Could not check permissions: {e}'}
-        else:
+        try:
+            # stat() only needs search access on /etc, not read access on the file itself,
+            # so no 'sudo stat' subprocess is needed even for /etc/shadow and /etc/sudoers
+            current_perm = format(stat.S_IMODE(os.stat(f_path).st_mode), 'o')
+            permissions[f_path] = {
+                'current': current_perm,
+                'recommended': expected_perm_str,
+                'is_secure': current_perm == expected_perm_str
+            }
+        except FileNotFoundError:
             permissions[f_path] = {'error': 'File not found'}
+        except OSError as e:
+            permissions[f_path] = {'error': f'Could not stat file: {e}'}
 
     return permissions
 
-def _check_pending_updates(logger):
-    """Checks for pending system updates on Ubuntu/Debian."""
+def _check_cron_permissions(logger):
+    """Lists the /etc/cron* files and directories with their mode and owner."""
+    logger.info("Checking permissions of cron configuration.")
+    cron_permissions = {}
+
+    try:
+        # scandir + stat in-process: no 'ls -l' subprocess and no output to re-parse
+        with os.scandir('/etc') as entries:
+            for entry in sorted(entries, key=lambda e: e.name):
+                if not entry.name.startswith('cron'):
+                    continue
+                try:
+                    entry_stat = entry.stat(follow_symlinks=False)
+                    # A symlink's own mode is always lrwxrwxrwx: judge the file it points to
+                    is_link = stat.S_ISLNK(entry_stat.st_mode)
+                    target_stat = entry.stat(follow_symlinks=True) if is_link else entry_stat
+                except OSError as e:
+                    cron_permissions[entry.path] = {'error': f'Could not stat file: {e}'}
+                    continue
+                cron_permissions[entry.path] = {
+                    'mode': stat.filemode(entry_stat.st_mode),
+                    'uid': entry_stat.st_uid,
+                    'gid': entry_stat.st_gid,
+                    # cron entries must be owned by root and not writable by other users:
+                    # world-writable is never allowed, group-writable only for the root group
+                    'is_secure': (
+                        target_stat.st_uid == 0
+                        and not target_stat.st_mode & stat.S_IWOTH
+                        and not (target_stat.st_mode & stat.S_IWGRP and target_stat.st_gid != 0)
+                    )
+                }
+                if is_link:
+                    cron_permissions[entry.path]['symlink_target'] = os.path.realpath(entry.path)
+    except OSError as e:
+        logger.error(f"Could not list /etc: {e}")
+
+    return cron_permissions
+
+async def _check_pending_updates(logger):
+    """
+    Checks for pending system updates on Ubuntu/Debian.
+    The result is cached until the APT package cache, the package lists
+    or the dpkg status change.
+    """
     logger.info("Checking for pending system updates.")
+    cache_key = f"{__name__}._check_pending_updates"
+    apt_pkgcache = '/var/cache/apt/pkgcache.bin'
+    apt_state_files = (
+        apt_pkgcache,
+        '/var/lib/dpkg/status',
+        '/var/lib/apt/lists', # directory mtime changes on 'apt-get update'
+        '/var/lib/apt/periodic/update-success-stamp'
+    )
+    # Without pkgcache.bin (e.g. Docker images with docker-clean) the APT state
+    # cannot be tracked reliably, so the simulation is always run
+    use_cache = os.path.exists(apt_pkgcache)
+    updates = cache_get(cache_key) if use_cache else None
+    if updates is not None:
+        logger.info("APT cache unchanged since last audit, reusing the pending updates result.")
+        return updates
+
     # This command is specific to Ubuntu/Debian and gives a summary
     # apt-get -s dist-upgrade will simulate an upgrade and show what would be installed
-    stdout, stderr = _run_command(['apt-get', '-s', 'dist-upgrade'], logger)
+    # Its output lists every package and is only scanned for the summary line: keep it as bytes
+    stdout, stderr = await _run_command(['apt-get', '-s', 'dist-upgrade'], logger, text=False)
     if stdout:
-        upgraded = re.search(r'(\d+)\s+upgraded', stdout)
-        newly_installed = re.search(r'(\d+)\s+newly installed', stdout)
-        removed = re.search(r'(\d+)\s+to remove', stdout)
+        upgraded = re.search(rb'(\d+)\s+upgraded', stdout)
+        newly_installed = re.search(rb'(\d+)\s+newly installed', stdout)
+        removed = re.search(rb'(\d+)\s+to remove', stdout)
         
-        return {
+        updates = {
             "upgraded_packages": int(upgraded.group(1)) if upgraded else 0,
             "newly_installed": int(newly_installed.group(1)) if newly_installed else 0,
             "to_be_removed": int(removed.group(1)) if removed else 0
         }
+        if use_cache:
+            cache_set(cache_key, updates, files=apt_state_files)
+        return updates
     return {"error": f"Could not check for updates. Sudo rights might be needed. Error: {stderr}"}
 
 
 # --- Main Module Function ---
 
-def run_linux_audit(logger):
+async def run_linux_audit(logger):
     """
     Orchestrates the full Linux system audit.
 
@@ -239,20 +371,30 @@ def run_linux_audit(logger):
         "user_info": {},
         "network_info": {},
         "file_permissions": {},
+        "cron_permissions": {},
         "pending_updates": {}
     }
 
-    # Run each audit function and store the results
-    audit_results["os_info"] = _get_os_info(logger)
-    audit_results["user_info"] = _get_user_info(logger)
-    audit_results["network_info"] = _get_network_info(logger)
+    # The privileged data is collected once and shared by the collectors that need it
+    privileged_data = asyncio.create_task(_collect_privileged_data(logger))
+
+    # Run the audit functions concurrently (they are independent) and store the results
+    (
+        audit_results["os_info"],
+        audit_results["user_info"],
+        audit_results["network_info"],
+        audit_results["pending_updates"]
+    ) = await asyncio.gather(
+        _get_os_info(logger),
+        _get_user_info(logger, privileged_data),
+        _get_network_info(logger, privileged_data),
+        _check_pending_updates(logger)
+    )
     audit_results["file_permissions"] = _check_sensitive_file_permissions(logger)
-    audit_results["pending_updates"] = _check_pending_updates(logger)
+    audit_results["cron_permissions"] = _check_cron_permissions(logger)
     
-    os.makedirs("audits", exist_ok=True)
     filename = f"audits/audit_systeme_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-    with open(filename, "w") as f:
-        json.dump(audit_results, f, indent=4)
+    save_json_report(filename, audit_results)
 
     logger.info("="*20 + " LINUX SYSTEM AUDIT FINISHED " + "="*20)
     return filename
\ No newline at end of file
@@ -1,8 +1,11 @@
+import asyncio
 from audit_system import run_linux_audit
 from audit_apache import run_apache_audit
 from utils import setup_logger, log_info
 import logging
 
+logger = logging.getLogger(__name__)
+
 def afficher_menu():
     print("\n=== MENU AUDIT DE SÉCURITÉ ===")
     print("1. Lancer l'audit système Linux")
@@ -10,16 +13,15 @@ def afficher_menu():
     print("3. Lancer les deux audits")
     print("4. Quitter")
 
-def main():
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - [%(levelname)s] - %(message)s',
-        handlers=[
-            logging.StreamHandler(), # Affiche les logs dans la console
-            logging.FileHandler('audit.log') # Enregistre dans un fichier
-        ]
+async def run_all_audits(logger):
+    """Lance les deux audits en parallèle : ils n'ont aucune ressource en commun."""
+    return await asyncio.gather(
+        run_linux_audit(logger),
+        run_apache_audit(logger)
     )
-    test_logger = logging.getLogger()
+
+def main():
+    setup_logger()
     log_info("=== Lancement du script principal ===")
 
     while True:
@@ -27,12 +29,11 @@ def main():
         choix = input("Votre choix (1-4) : ").strip()
 
         if choix == "1":
-            run_linux_audit(test_logger)
+            asyncio.run(run_linux_audit(logger))
         elif choix == "2":
-            run_apache_audit(test_logger)
+            asyncio.run(run_apache_audit(logger))
         elif choix == "3":
-            run_linux_audit(test_logger)
-            run_apache_audit(test_logger)
+            asyncio.run(run_all_audits(logger))
         elif choix == "4":
             log_info("Fin du script principal.")
             break
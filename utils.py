@@ -1,24 +1,168 @@
 # utils.py
 
+import copy
+import functools
+import json
 import logging
 import os
+import threading
+
+try:
+    import orjson  # Encodeur JSON en C, optionnel
+except ImportError:
+    orjson = None
 
 LOG_FILE = "audit.log"
+CACHE_FILE = os.path.join("audits", ".cache.json")
+BOOT_ID_FILE = "/proc/sys/kernel/random/boot_id"
+# Version du format du cache : à incrémenter à chaque changement de l'analyse
+# ou de la forme des valeurs stockées, pour invalider les entrées existantes
+CACHE_VERSION = 2
+
+logger = logging.getLogger(__name__)
+
+_cache = None
+# Le cache peut être alimenté depuis les threads de travail d'asyncio
+_cache_lock = threading.Lock()
 
 def setup_logger():
-    """Configure le logger global pour écrire dans audit.log"""
+    """
+    Configure le logger global pour écrire dans la console et dans audit.log.
+    À appeler une seule fois, au démarrage du script principal.
+    """
     os.makedirs("audits", exist_ok=True)
     logging.basicConfig(
-        filename=LOG_FILE,
-        filemode="a",
-        format="%(asctime)s - %(levelname)s - %(message)s",
-        level=logging.INFO
+        level=logging.INFO,
+        format="%(asctime)s - [%(levelname)s] - %(message)s",
+        handlers=[
+            logging.StreamHandler(), # Affiche les logs dans la console
+            logging.FileHandler(LOG_FILE, mode="a") # Enregistre dans un fichier
+        ]
     )
 
 def log_info(message):
     """Log d'information"""
-    logging.info(message)
+    logger.info(message)
 
 def log_error(message):
     """Log d'erreur"""
-    logging.error(message)
+    logger.error(message)
+
+def save_json_report(filename, data):
+    """
+    Écrit un rapport d'audit au format JSON de manière atomique :
+    le contenu est d'abord écrit dans un fichier temporaire puis renommé,
+    pour ne jamais laisser de rapport tronqué (ex: interruption par Ctrl-C).
+    Utilise orjson s'il est installé, sinon le module json standard.
+    """
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    tmp_filename = f"{filename}.tmp"
+    try:
+        if orjson is not None:
+            with open(tmp_filename, "wb") as f:
+                f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        else:
+            with open(tmp_filename, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        raise
+    return filename
+
+# --- Cache des résultats d'audit ---
+
+def _file_stamp(path):
+    """Retourne le mtime (en ns) d'un fichier, ou None s'il n'existe pas"""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def _boot_id():
+    """Identifiant du démarrage courant : change uniquement au redémarrage"""
+    try:
+        with open(BOOT_ID_FILE, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def _load_cache():
+    """Charge le cache persistant depuis audits/.cache.json (une seule fois par processus)"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            try:
+                with open(CACHE_FILE, "r", encoding="utf-8") as f:
+                    _cache = json.load(f)
+            except (OSError, ValueError):
+                _cache = {}
+            if not isinstance(_cache, dict):
+                _cache = {}
+    return _cache
+
+def cache_get(key, per_boot=False):
+    """
+    Retourne une copie de la valeur en cache pour `key`, ou None si elle est absente
+    ou invalidée (version du cache différente, fichier dépendant modifié,
+    ou redémarrage si `per_boot`). Une entrée mal formée est traitée comme absente.
+    """
+    entry = _load_cache().get(key)
+    try:
+        if entry["version"] != CACHE_VERSION:
+            return None
+        if per_boot and entry["boot_id"] != _boot_id():
+            return None
+        if any(_file_stamp(path) != stamp for path, stamp in entry["files"].items()):
+            return None
+        return copy.deepcopy(entry["value"])
+    except (KeyError, TypeError, AttributeError):
+        return None
+
+def cache_set(key, value, files=(), per_boot=False):
+    """Enregistre `value` pour `key` avec le mtime des fichiers dont elle dépend"""
+    cache = _load_cache()
+    entry = {
+        "version": CACHE_VERSION,
+        "files": {path: _file_stamp(path) for path in files},
+        "boot_id": _boot_id() if per_boot else None,
+        "value": copy.deepcopy(value)
+    }
+    # Écriture atomique (fichier temporaire propre au processus puis renommage) :
+    # une exécution interrompue ou concurrente ne laisse jamais un cache tronqué
+    tmp_filename = f"{CACHE_FILE}.{os.getpid()}.tmp"
+    with _cache_lock:
+        cache[key] = entry
+        try:
+            os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
+            with open(tmp_filename, "w", encoding="utf-8") as f:
+                json.dump(cache, f)
+            os.replace(tmp_filename, CACHE_FILE)
+        except OSError as e:
+            logger.warning(f"Impossible d'enregistrer le cache '{CACHE_FILE}': {e}")
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+
+def cached(*files, per_boot=False):
+    """
+    Mémoïse une coroutine de collecte `func(logger)`.
+    Le résultat est réutilisé tant que le mtime de `files` ne change pas et,
+    si `per_boot` est vrai, tant que la machine n'a pas redémarré.
+    Les résultats vides (échec de la collecte) ne sont pas mis en cache.
+    """
+    def decorator(func):
+        key = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        async def wrapper(logger):
+            value = cache_get(key, per_boot)
+            if value is not None:
+                logger.info(f"Résultat de '{func.__name__}' repris du cache.")
+                return value
+            value = await func(logger)
+            if value:
+                cache_set(key, value, files, per_boot)
+            return value
+        return wrapper
+    return decorator